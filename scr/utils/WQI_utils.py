@@ -2,17 +2,71 @@ import numpy as np
 import pandas as pd
 import warnings
 import calendar
-from pystac_client import Client as StacClient
-import stackstac
 import xarray as xr
 
+from indices import normalized_diff
+from stac_utils import search_items, stac_client, stack_items
+
 warnings.filterwarnings("ignore")
 
 TAMPA_BAY = (-82.7167, 27.5833, -82.3833, 28.0333)
 
-def normalized_diff(b1, b2):
-    """Compute normalized difference (b1-b2)/(b1+b2)."""
-    return (b1 - b2) / (b1 + b2 + 1e-10)
+# Month names indexed by month number (index 0 is the empty string)
+_MONTH_NAMES = np.array(calendar.month_name)
+
+# Sentinel-2 SCL classes: 5 = bare soil, 6 = water; 3 = cloud shadow,
+# 8/9 = medium/high probability cloud, 10 = thin cirrus
+SCL_WATER_CLASSES = (5, 6)
+SCL_CLOUD_CLASSES = (3, 8, 9, 10)
+
+def _scl_lut(classes):
+    """256-entry boolean lookup table marking the given SCL classes."""
+    lut = np.zeros(256, dtype=bool)
+    lut[list(classes)] = True
+    return lut
+
+_SCL_WATER_LUT = _scl_lut(SCL_WATER_CLASSES)
+
+def _scl_mask(scl, lut):
+    """
+    Lazy boolean class mask for an SCL DataArray; NaN (nodata) maps to class 0.
+
+    The gather runs as the LUT's bound `take` method, which pickles by value, so
+    dask workers need not be able to import this module.
+    """
+    return xr.apply_ufunc(
+        lut.take,
+        scl.fillna(0).astype(np.uint8),
+        dask="parallelized",
+        output_dtypes=[bool]
+    )
+
+def _as_float32(band):
+    """Band as float32; integer nodata (0) becomes NaN."""
+    if np.issubdtype(band.dtype, np.floating):
+        return band
+    return band.astype(np.float32).where(band != 0)
+
+def _wqi_indices(green, red, nir, rededge1, water_mask=None):
+    """
+    Lazily compute NDWI, NDTI and NDCI from band DataArrays.
+
+    Integer (raw DN) bands are promoted to float32 here. Non-finite results
+    are set to NaN, as are pixels where `water_mask` is False when it is given.
+
+    Built from xarray/dask elementwise operations only, so the graph carries no
+    functions from this module (dask workers need not be able to import it);
+    dask fuses each index chain with the band reads into one task per chunk.
+    """
+    green, red, nir, rededge1 = (_as_float32(b) for b in (green, red, nir, rededge1))
+    indices = []
+    for b1, b2 in ((green, nir), (red, green), (rededge1, red)):
+        index = normalized_diff(b1, b2)
+        keep = np.isfinite(index)
+        if water_mask is not None:
+            keep &= water_mask
+        indices.append(index.where(keep))
+    return tuple(indices)
 
 def compute_wqi_indices(
     bbox=TAMPA_BAY,
@@ -26,7 +80,10 @@ def compute_wqi_indices(
     output_path="wqi_results.csv",
     anomaly_detection=False,
     rolling_window=3,
-    diagnostics=True
+    diagnostics=True,
+    cache_dir=None,
+    min_water_fraction=None,
+    band_dtype="float32"
 ):
     """
     Modular computation of water quality indices (NDWI, NDTI, NDCI) from Sentinel-2 imagery
@@ -59,6 +116,14 @@ def compute_wqi_indices(
         Window size for rolling averages. Default: 3.
     diagnostics : bool
         If True, print detailed diagnostics for the first 5 scenes. Default: True.
+    cache_dir : str or None
+        Directory for caching STAC search results between runs. Default: None (no caching).
+    min_water_fraction : float or None
+        If set, drop scenes whose SCL water/bare-soil fraction over the bbox is below this
+        value before any reflectance bands are read. Default: None (keep all scenes).
+    band_dtype : str
+        Dtype of the raw band stack. "uint16" keeps Sentinel-2 DNs at half the memory
+        and promotes to float32 only when the indices are computed. Default: "float32".
 
     Returns
     -------
@@ -69,15 +134,16 @@ def compute_wqi_indices(
     monthly_avg : pandas.DataFrame
         Monthly average indices (aggregated by calendar month).
     """
-
-    client = StacClient.open("https://earth-search.aws.element84.com/v1")
-    search = client.search(
-        collections=["sentinel-2-l2a"],
-        bbox=bbox,
-        datetime=f"{start_date}/{end_date}",
-        max_items=max_items
+    client = stac_client("https://earth-search.aws.element84.com/v1")
+    items = search_items(
+        client,
+        "sentinel-2-l2a",
+        bbox,
+        start_date,
+        end_date,
+        max_items=max_items,
+        cache_dir=cache_dir
     )
-    items = search.item_collection()
 
     if not items:
         print("No scenes found.")
@@ -93,26 +159,51 @@ def compute_wqi_indices(
         print("No low-cloud scenes found.")
         return None, None, None
 
+    # SCL-only stack (20 m, one asset per scene), shared by the water filter and diagnostics
+    scl_stack = None
+
+    # WATER FILTER: screen scenes on the SCL band alone
+    if min_water_fraction is not None:
+        scl_stack = stack_items(items, ["scl"], bbox, epsg, dtype=band_dtype).sel(band="scl")
+        water_frac = _scl_mask(scl_stack, _SCL_WATER_LUT).mean(dim=("x", "y")).values
+        keep_ids = set(scl_stack.id.values[water_frac >= min_water_fraction])
+
+        original_count = len(items)
+        items = [item for item in items if item.id in keep_ids]
+        print(f"Water filtered: {original_count} → {len(items)} scenes (≥{min_water_fraction:.0%} water)")
+
+        if not items:
+            print("No scenes with enough water found.")
+            return None, None, None
+
     # DIAGNOSTICS
     if diagnostics:
         print("\n=== FULL DATA QUALITY DIAGNOSTICS (First 5 Scenes) ===")
         print("="*80)
 
-    assets = ["green", "red", "nir", "rededge1", "scl"]
-    stack = stackstac.stack(
-        items,
-        assets=assets,
-        bounds_latlon=bbox,
-        epsg=epsg,
-        chunksize=(1, 1, -1, "auto"),
-        dtype="float32",
-        fill_value=np.float32(np.nan),
-        rescale=False
-    )
+    # Every band of a scene tile is read together, so only stack SCL when it masks the indices
+    assets = ["green", "red", "nir", "rededge1"]
+    if filter_clouds:
+        assets.append("scl")
+    stack = stack_items(items, assets, bbox, epsg, dtype=band_dtype)
 
-    # Scene diagnostics
-    for i, item in enumerate(items[:5]):
-        if diagnostics:
+    # Scene diagnostics; SCL for all diagnosed scenes is read in one compute from the
+    # SCL-only stack, so no reflectance bands are fetched for them
+    if diagnostics:
+        diag_items = items[:5]
+        scl_scenes, scl_error = None, None
+        try:
+            if scl_stack is None:
+                scl_stack = stack_items(diag_items, ["scl"], bbox, epsg, dtype=band_dtype).sel(band="scl")
+            # Stack time order follows acquisition date, not search order
+            time_index = {scene_id: t for t, scene_id in enumerate(scl_stack.id.values)}
+            scl_scenes = scl_stack.isel(
+                time=[time_index[item.id] for item in diag_items]
+            ).values
+        except Exception as e:
+            scl_error = e
+
+        for i, item in enumerate(diag_items):
             dt = pd.to_datetime(item.properties["datetime"], utc=True).tz_localize(None)
             print(f"\nSCENE {i+1}: {dt.date()} | ID: {item.id[:8]}...")
 
@@ -128,46 +219,31 @@ def compute_wqi_indices(
             cloud_pct = item.properties.get('eo:cloud_cover', 'N/A')
             print(f"Cloud cover (metadata): {cloud_pct}%")
 
-            # SCL Analysis
-            try:
-                scene = stack.sel(time=dt, method="nearest")
-                if "scl" in scene.band.values:
-                    scl = scene.sel(band="scl").compute()
-                    cloud_pixels = ((scl == 3) | (scl == 8) | (scl == 9) | (scl == 10)).sum().item()
-                    water_pixels = (scl == 6).sum().item()
-                    total_valid = np.isfinite(scl).sum().item()
-
-                    cloud_ratio = cloud_pixels / total_valid if total_valid > 0 else 0
-                    water_ratio = water_pixels / total_valid if total_valid > 0 else 0
-
-                    print(f"SCL breakdown: Clouds={cloud_ratio:.1%} | Water={water_ratio:.1%} | Valid={total_valid:,}px")
-                else:
-                    print("No SCL band available")
-            except Exception as e:
-                print(f"SCL analysis failed: {e}")
-
-    # Compute indices
-    green = stack.sel(band="green")
-    red = stack.sel(band="red")
-    nir = stack.sel(band="nir")
-    rededge1 = stack.sel(band="rededge1")
-
-    ndwi = normalized_diff(green, nir)
-    ndti = normalized_diff(red, green)
-    ndci = normalized_diff(rededge1, red)
-
-    # Water mask
-    if filter_clouds and "scl" in stack.band.values:
-        scl = stack.sel(band="scl")
-        water_mask = (scl == 6) | (scl == 5)
-        ndwi = ndwi.where(water_mask)
-        ndti = ndti.where(water_mask)
-        ndci = ndci.where(water_mask)
-
-    # Clean NaNs
-    ndwi = ndwi.where(np.isfinite(ndwi))
-    ndti = ndti.where(np.isfinite(ndti))
-    ndci = ndci.where(np.isfinite(ndci))
+            # SCL Analysis: one histogram pass gives every class count
+            if scl_error is not None:
+                print(f"SCL analysis failed: {scl_error}")
+            else:
+                scl = scl_scenes[i]
+                valid = np.isfinite(scl) & (scl != 0)
+                class_counts = np.bincount(scl[valid].astype(np.uint8), minlength=256)
+                cloud_pixels = class_counts[list(SCL_CLOUD_CLASSES)].sum()
+                water_pixels = class_counts[6]
+                total_valid = int(valid.sum())
+
+                cloud_ratio = cloud_pixels / total_valid if total_valid > 0 else 0
+                water_ratio = water_pixels / total_valid if total_valid > 0 else 0
+
+                print(f"SCL breakdown: Clouds={cloud_ratio:.1%} | Water={water_ratio:.1%} | Valid={total_valid:,}px")
+
+    # Compute indices; split bands into variables once (per-band metadata coords dropped)
+    ds = stack.reset_coords(drop=True).to_dataset(dim="band")
+    water_mask = None
+    if filter_clouds:
+        water_mask = _scl_mask(ds["scl"], _SCL_WATER_LUT)
+
+    ndwi, ndti, ndci = _wqi_indices(
+        ds["green"], ds["red"], ds["nir"], ds["rededge1"], water_mask=water_mask
+    )
 
     # Time series
     ndwi_mean_t = ndwi.mean(dim=("x", "y"))
@@ -185,44 +261,56 @@ def compute_wqi_indices(
 
     ds_ts = ds_ts.compute()
 
-    # DataFrame
-    df_results = ds_ts.to_dataframe().reset_index()
+    # DataFrame; index columns only, already float so no cast is needed
+    wqi_cols = list(ds_ts.data_vars)
+    df_results = ds_ts.to_dataframe()[wqi_cols].reset_index()
     df_results["time"] = pd.to_datetime(df_results["time"], utc=True).dt.tz_localize(None)
     df_results = df_results.rename(columns={"time": "date"})
     df_results.set_index("date", inplace=True)
     df_results.sort_index(inplace=True)
 
-    # Keep numeric columns only
-    wqi_cols = [col for col in df_results.columns if col.startswith(('ndwi', 'ndti', 'ndci'))]
-    df_results = df_results[wqi_cols].astype(float)
+    if df_results.empty:
+        print("Analysis complete: 0 scenes processed")
+        return df_results, df_results.copy(), pd.DataFrame()
 
     # Rolling averages
     df_rolling = df_results.rolling(window=rolling_window, min_periods=1).mean()
 
     # Monthly averages
-    if not df_results.empty:
-        df_results["month"] = df_results.index.month
-        monthly_cols = [col for col in df_results.columns if col.startswith(('ndwi', 'ndti', 'ndci'))]
-        monthly_avg = df_results.groupby("month")[monthly_cols].mean()
-        monthly_avg.index = [calendar.month_name[m] for m in monthly_avg.index]
-    else:
-        monthly_avg = pd.DataFrame()
+    df_results["month"] = df_results.index.month
+    # NaN-aware per-month means over 12 fixed bins; only months with scenes are kept
+    months = df_results["month"].to_numpy()
+    present = np.flatnonzero(np.bincount(months, minlength=13))
+    monthly = {}
+    for col in wqi_cols:
+        values = df_results[col].to_numpy(dtype=float)
+        valid = ~np.isnan(values)
+        sums = np.bincount(months[valid], weights=values[valid], minlength=13)
+        counts = np.bincount(months[valid], minlength=13)
+        with np.errstate(invalid="ignore"):
+            monthly[col] = (sums / counts)[present]
+    month_index = pd.CategoricalIndex(
+        _MONTH_NAMES[present], categories=_MONTH_NAMES[1:], ordered=True
+    )
+    monthly_avg = pd.DataFrame(monthly, index=month_index)
 
     # Anomaly detection
-    if anomaly_detection and not df_results.empty:
-        for col in ["ndwi_mean", "ndti_mean", "ndci_mean"]:
-            if col in df_results.columns:
-                z = (df_results[col] - df_results[col].mean()) / df_results[col].std()
-                df_results[f"{col}_zscore"] = z
-                df_results[f"{col}_anomaly"] = z.abs() > 3
+    if anomaly_detection:
+        mean_cols = ["ndwi_mean", "ndti_mean", "ndci_mean"]
+        values = df_results[mean_cols].to_numpy(dtype=float)
+        # Same NaN-skipping, sample (ddof=1) statistics as pandas mean()/std()
+        with np.errstate(invalid="ignore", divide="ignore"):
+            z_scores = (values - np.nanmean(values, axis=0)) / np.nanstd(values, axis=0, ddof=1)
+        for j, col in enumerate(mean_cols):
+            df_results[f"{col}_zscore"] = z_scores[:, j]
+            df_results[f"{col}_anomaly"] = np.abs(z_scores[:, j]) > 3
 
     # Export CSV
-    if export_csv and not df_results.empty:
+    if export_csv:
         df_results.to_csv(output_path)
         print(f"WQI statistics exported to {output_path}")
 
     print(f"Analysis complete: {len(df_results)} scenes processed")
-    if not df_results.empty:
-        print(f"NDWI range: {df_results['ndwi_mean'].min():.3f} to {df_results['ndwi_mean'].max():.3f}")
+    print(f"NDWI range: {df_results['ndwi_mean'].min():.3f} to {df_results['ndwi_mean'].max():.3f}")
 
     return df_results, df_rolling, monthly_avg
@@ -1,10 +1,172 @@
-from typing import Dict, List, Tuple, Union
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple, Union
+import fsspec
+import joblib
 import xarray as xr
 import pandas as pd
-from pystac_client import Client as STACClient
-import planetary_computer as pc
+from pystac import ItemCollection
 from pystac.item import Item
 
+from stac_utils import search_items, stac_client
+
+SST_CHUNK_BYTES = 8 * 1024 * 1024
+
+
+@functools.lru_cache(maxsize=4)
+def _open_sst_zarr(sst_zarr_url: str, cache_dir: Optional[str] = None) -> xr.Dataset:
+    """
+    Open the SST Zarr store once per process.
+
+    When `cache_dir` is given, chunks are read through an fsspec `simplecache`
+    layer so repeated runs are served from local disk instead of S3.
+    """
+    if cache_dir is None:
+        return xr.open_zarr(sst_zarr_url, storage_options={"anon": True})
+
+    protocol = sst_zarr_url.split("://", 1)[0]
+    mapper = fsspec.get_mapper(
+        f"simplecache::{sst_zarr_url}",
+        simplecache={"cache_storage": os.path.join(cache_dir, "sst_chunks")},
+        **{protocol: {"anon": True}},
+    )
+    return xr.open_zarr(mapper)
+
+
+def _monthly_sst(
+    bbox: Tuple[float, float, float, float],
+    start_date: str,
+    end_date: str,
+    sst_zarr_url: str,
+    cache_dir: Optional[str] = None,
+) -> xr.DataArray:
+    """
+    Bbox-averaged monthly SST (°C) from the Zarr store at `sst_zarr_url`.
+
+    The series is returned already computed (numpy-backed), so it can be
+    pickled straight into the joblib cache.
+    """
+    # Define common variables based on the provided URL for modularity
+    is_mur_data = "mur-sst" in sst_zarr_url.lower()
+    sst_var_name = "sst" if is_mur_data else "analysed_sst"
+
+    ds = _open_sst_zarr(sst_zarr_url, cache_dir)
+
+    # Select variable name dynamically based on the URL
+    sst = (
+        ds[sst_var_name]
+        .sel(
+            time=slice(start_date, end_date),
+            lat=slice(bbox[1], bbox[3]),
+            lon=slice(bbox[0], bbox[2]),
+        )
+        # float32 is ample for bbox means and halves bytes moved vs float64
+        .astype("float32")
+    )
+
+    # A small bbox gives tiny per-day slices; size time blocks to ~8 MB so work
+    # per task is dominated by bytes rather than scheduling and request latency
+    pixels_per_step = max(1, sst.sizes["lat"] * sst.sizes["lon"])
+    time_chunk = max(1, SST_CHUNK_BYTES // (pixels_per_step * sst.dtype.itemsize))
+    sst = sst.chunk({"time": time_chunk, "lat": -1, "lon": -1})
+
+    # Final aggregation logic (common to both)
+    sst = sst.mean(dim=["lat", "lon"])
+    # The bbox mean is a small 1-D series; pandas resamples it far faster than
+    # xarray's resample machinery, and loading it once avoids re-reading S3
+    monthly = sst.compute().to_series().resample("1ME").mean()
+    sst = xr.DataArray.from_series(monthly)
+
+    # Apply Kelvin conversion only if not MUR data
+    if not is_mur_data:
+        # Original dataset requires conversion from Kelvin to Celsius.
+        # Means are linear, so offsetting the monthly series equals offsetting
+        # every pixel, without an extra pass over the full lat/lon cube.
+        sst = sst - 273.15
+        print("Note: SST conversion (Kelvin to Celsius) applied.")
+
+    sst.name = "sst"
+
+    return sst
+
+
+def _load_sst(
+    bbox: Tuple[float, float, float, float],
+    start_date: str,
+    end_date: str,
+    sst_zarr_url: str,
+    cache_dir: Optional[str] = None,
+) -> Optional[xr.DataArray]:
+    """Monthly SST series for the bbox, or None if the fetch fails."""
+    try:
+        if cache_dir is None:
+            return _monthly_sst(bbox, start_date, end_date, sst_zarr_url)
+
+        # Monthly series are tiny, so memoize them on disk keyed by the arguments
+        memory = joblib.Memory(os.path.join(cache_dir, "joblib"), verbose=0)
+        return memory.cache(_monthly_sst)(
+            tuple(bbox), start_date, end_date, sst_zarr_url, cache_dir
+        )
+
+    except Exception as e:
+        print(f"SST fetch and processing failed: {e}")
+        return None
+
+
+def _load_precip(
+    bbox: Tuple[float, float, float, float],
+    start_date: str,
+    end_date: str,
+    precip_collection: str,
+    stac_api_url: str,
+    cache_dir: Optional[str] = None,
+) -> Optional[List[Item]]:
+    """
+    Signed precipitation items for the bbox, or None if none are found or the search fails.
+
+    Searches run unsigned (and are cached unsigned under `cache_dir`, since SAS
+    tokens expire); the combined result is signed once at the end.
+    """
+    # Imported here so SST-only callers don't pay for it at import
+    import planetary_computer as pc
+
+    all_items: List[Item] = []
+    stac_cache = None if cache_dir is None else os.path.join(cache_dir, "stac")
+
+    try:
+        client = stac_client(stac_api_url)
+
+        # Yearly windows keep each query small enough to avoid API timeouts;
+        # the first and last windows are clipped to the requested dates
+        start_year = pd.to_datetime(start_date).year
+        end_year = pd.to_datetime(end_date).year
+        year_starts: List[str] = [start_date] + [
+            f"{year}-01-01" for year in range(start_year + 1, end_year + 1)
+        ]
+        year_ends: List[str] = [
+            f"{year}-12-31" for year in range(start_year, end_year)
+        ] + [end_date]
+
+        def _search_year(y_start: str, y_end: str) -> ItemCollection:
+            return search_items(
+                client, precip_collection, bbox, y_start, y_end, cache_dir=stac_cache
+            )
+
+        # The windows are independent, so fetch them concurrently. A timeout in
+        # any year is re-raised here and handled by the except below.
+        with ThreadPoolExecutor(max_workers=max(1, min(len(year_starts), 8))) as executor:
+            for year_items in executor.map(_search_year, year_starts, year_ends):
+                all_items.extend(year_items)
+
+        if not all_items:
+            return None
+        return list(pc.sign(ItemCollection(all_items)))
+
+    except Exception as e:
+        print(f"Precipitation search failed or timed out: {e}")
+        return None
+
 
 def environmental_variables(
     bbox: Tuple[float, float, float, float],
@@ -15,6 +177,7 @@ def environmental_variables(
     sst_zarr_url: str = "s3://surftemp-sst/data/sst.zarr",
     precip_collection: str = "noaa-mrms-qpe-24h-pass2",
     stac_api_url: str = "https://planetarycomputer.microsoft.com/api/stac/v1",
+    cache_dir: Optional[str] = None,
 ) -> Dict[str, Union[xr.DataArray, List[Item], None]]:
     """
     Modular environmental data fetcher for SST and Precipitation.
@@ -33,95 +196,39 @@ def environmental_variables(
         STAC Collection ID for precipitation data.
     stac_api_url : str
         Base URL for the STAC API endpoint.
+    cache_dir : str, optional
+        Local directory used to cache remote SST chunks, the resulting
+        monthly SST series and the (unsigned) precipitation STAC search results
+        between runs. Delete it when the source store is updated.
+        Default: None (no on-disk caching).
 
     Returns
     -------
     dict
         Dictionary with keys matching the requested variables, containing either
-        an xr.DataArray (for SST) or a List[Item] (for Precipitation, or None if
-        the STAC API request fails or times out).
+        an xr.DataArray (for SST; the monthly series is already computed, so no
+        further `.compute()` is needed) or a List[Item] (for Precipitation, or None
+        if the STAC API request fails or times out).
     """
 
-    results: Dict[str, Union[xr.DataArray, List[Item], None]] = {}
-
-    # Define common variables based on the provided URL for modularity
-    is_mur_data = "mur-sst" in sst_zarr_url.lower()
-    sst_var_name = "sst" if is_mur_data else "analysed_sst"
-
-    # ======================
-    # SST (Zarr) - Fully Modular and Adaptive
-    # ======================
-    if "sst" in variables:
-        try:
-            ds = xr.open_zarr(sst_zarr_url, storage_options={"anon": True})
-
-            # Select variable name dynamically based on the URL
-            sst = (
-                ds[sst_var_name]
-                .sel(
-                    time=slice(start_date, end_date),
-                    lat=slice(bbox[1], bbox[3]),
-                    lon=slice(bbox[0], bbox[2]),
-                )
-                .chunk({"time": "auto", "lat": -1, "lon": -1})
-            )
-
-            # Apply Kelvin conversion only if not MUR data
-            if not is_mur_data:
-                # Original dataset requires conversion from Kelvin to Celsius
-                sst = sst - 273.15
-                print("Note: SST conversion (Kelvin to Celsius) applied.")
-
-            # Final aggregation logic (common to both)
-            sst = sst.mean(dim=["lat", "lon"])
-            sst = sst.resample(time="1ME").mean()
-            sst.name = "sst"
-
-            results["sst"] = sst
-
-        except Exception as e:
-            print(f"SST fetch and processing failed: {e}")
-            results["sst"] = None
-
-    # ======================
-    # Precipitation (STAC) - Robust Item Retrieval with timeout handling
-    # ======================
-    if "precip" in variables:
-        all_items: List[Item] = []
-
-        try:
-            client = STACClient.open(
-                stac_api_url,
-                modifier=pc.sign_inplace,
-            )
-
-            for year in range(
-                pd.to_datetime(start_date).year,
-                pd.to_datetime(end_date).year + 1,
-            ):
-                y_start = f"{year}-01-01"
-                y_end = f"{year}-12-31"
-
-                if year == pd.to_datetime(start_date).year:
-                    y_start = start_date
-                if year == pd.to_datetime(end_date).year:
-                    y_end = end_date
-
-                search = client.search(
-                    collections=[precip_collection],
-                    datetime=f"{y_start}/{y_end}",
-                    bbox=bbox,
-                    # no limit → pagination handled internally
-                )
-
-                # This call may time out for large queries, so keep inside try/except
-                year_items = list(search.get_all_items())
-                all_items.extend(year_items)
-
-            results["precip"] = all_items if all_items else None
-
-        except Exception as e:
-            print(f"Precipitation search failed or timed out: {e}")
-            results["precip"] = None
-
-    return results
\ No newline at end of file
+    loaders = {
+        # SST (Zarr)
+        "sst": functools.partial(
+            _load_sst, bbox, start_date, end_date, sst_zarr_url, cache_dir
+        ),
+        # Precipitation (STAC) - Robust Item Retrieval with timeout handling
+        "precip": functools.partial(
+            _load_precip,
+            bbox, start_date, end_date, precip_collection, stac_api_url, cache_dir
+        ),
+    }
+    requested = [var for var in loaders if var in variables]
+
+    # SST (S3) and precipitation (STAC API) hit different services, so fetch them concurrently
+    with ThreadPoolExecutor(max_workers=max(1, len(requested))) as executor:
+        futures = {var: executor.submit(loaders[var]) for var in requested}
+
+    results: Dict[str, Union[xr.DataArray, List[Item], None]] = {
+        var: future.result() for var, future in futures.items()
+    }
+    return results
@@ -0,0 +1,3 @@
+def normalized_diff(b1, b2):
+    """Compute normalized difference (b1-b2)/(b1+b2)."""
+    return (b1 - b2) / (b1 + b2 + 1e-10)
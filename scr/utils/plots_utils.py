@@ -5,7 +5,8 @@ import calendar
 import numpy as np
 
 def plot_wqi_time_series(df_results, df_rolling=None, indices=["ndwi", "ndti", "ndci"], 
-                         title="WQI Time Series", show_anomalies=True, anomaly_suffix="_mean_anomaly"):
+                         title="WQI Time Series", show_anomalies=True, anomaly_suffix="_mean_anomaly",
+                         dpi=300):
     """
     Plot WQI time series with mean, median, and optional rolling mean and anomalies.
 
@@ -23,6 +24,9 @@ def plot_wqi_time_series(df_results, df_rolling=None, indices=["ndwi", "ndti", "
         If True, mark anomalies in the mean panel.
     anomaly_suffix : str
         Suffix for anomaly flag columns in df_results.
+    dpi : int
+        Resolution of the saved PNG. Lower values (e.g., 150) save much faster
+        for quick-look runs. Default: 300.
 
     Returns
     -------
@@ -34,19 +38,24 @@ def plot_wqi_time_series(df_results, df_rolling=None, indices=["ndwi", "ndti", "
         axes = axes.reshape(1, 3)
     
     colors = ['blue', 'orange', 'green']
+
+    # x data shared by every panel, converted from the index once
+    x = df_results.index.to_numpy()
     
     for i, (idx, color) in enumerate(zip(indices, colors)):
+        mean_vals = df_results[f'{idx}_mean'].to_numpy()
+
         # Mean panel
         ax_mean = axes[i, 0]
-        ax_mean.plot(df_results.index, df_results[f'{idx}_mean'], 
+        ax_mean.plot(x, mean_vals, 
                      color=color, linewidth=2, alpha=0.8, label='Mean')
         
         # Anomalies on mean
         if show_anomalies:
             anom_col = f'{idx}{anomaly_suffix}'
             if anom_col in df_results.columns:
-                anomalies = df_results[df_results[anom_col] == True]
-                ax_mean.scatter(anomalies.index, anomalies[f'{idx}_mean'], 
+                is_anomaly = df_results[anom_col].to_numpy(dtype=bool, na_value=False)
+                ax_mean.scatter(x[is_anomaly], mean_vals[is_anomaly], 
                                 color='red', s=100, marker='^', 
                                 edgecolor='black', linewidth=1.5, zorder=5, label='Anomalies')
         
@@ -56,7 +65,7 @@ def plot_wqi_time_series(df_results, df_rolling=None, indices=["ndwi", "ndti", "
         
         # Median panel  
         ax_med = axes[i, 1]
-        ax_med.plot(df_results.index, df_results[f'{idx}_median'], 
+        ax_med.plot(x, df_results[f'{idx}_median'].to_numpy(), 
                     color=color, linewidth=2, alpha=0.8, linestyle='--', label='Median')
         ax_med.set_title(f'{idx.upper()} - MEDIAN', fontweight='bold')
         ax_med.grid(alpha=0.3)
@@ -68,7 +77,7 @@ def plot_wqi_time_series(df_results, df_rolling=None, indices=["ndwi", "ndti", "
             ax_roll.plot(df_rolling.index, df_rolling[f'{idx}_mean'], 
                          color=color, linewidth=3, label='Rolling Mean')
             # Overlay raw mean faintly
-            ax_roll.plot(df_results.index, df_results[f'{idx}_mean'], 
+            ax_roll.plot(x, mean_vals, 
                          color=color, alpha=0.3, linewidth=0.8)
         ax_roll.set_title(f'{idx.upper()} - ROLLING', fontweight='bold')
         ax_roll.grid(alpha=0.3)
@@ -79,6 +88,6 @@ def plot_wqi_time_series(df_results, df_rolling=None, indices=["ndwi", "ndti", "
         ax.xaxis.set_major_formatter(DateFormatter('%Y-%m'))
     
     fig.suptitle(title, fontsize=16, fontweight='bold')
-    plt.tight_layout(rect=[0, 0, 1, 0.96])
-    plt.savefig(f'{title.replace(" ", "_")}.png', dpi=300, bbox_inches='tight')
+    fig.tight_layout(rect=[0, 0, 1, 0.96])
+    fig.savefig(f'{title.replace(" ", "_")}.png', dpi=dpi, bbox_inches='tight')
     plt.show()
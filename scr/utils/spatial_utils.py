@@ -1,28 +1,83 @@
+import dask
 import matplotlib.pyplot as plt
 import numpy as np
+import xarray as xr
 
-def normalized_diff(b1, b2):
+from indices import normalized_diff
+
+# Longest map side (in pixels) worth rendering; larger maps are block-averaged first
+DISPLAY_MAX_PIXELS = 1500
+
+
+def _wqi_dataset(stack):
     """
-    Compute the normalized difference between two arrays.
+    Build NDWI, NDTI and NDCI for every scene in a stack as one lazy Dataset.
 
     Parameters
     ----------
-    b1, b2 : array-like
-        Input arrays (e.g., image bands).
+    stack : xarray.DataArray
+        Multi-band stack containing at least 'green', 'red', 'nir', 'rededge1'.
 
     Returns
     -------
-    np.ndarray
-        Normalized difference (b1 - b2) / (b1 + b2), with small epsilon to avoid division by zero.
+    xarray.Dataset
+        Variables "NDWI", "NDTI" and "NDCI" with dims (time, y, x).
+    """
+    # Split bands once; green and red each feed two indices from the same reads
+    ds = stack.reset_coords(drop=True).to_dataset(dim="band")
+    return xr.Dataset({
+        "NDWI": normalized_diff(ds["green"], ds["nir"]),
+        "NDTI": normalized_diff(ds["red"], ds["green"]),
+        "NDCI": normalized_diff(ds["rededge1"], ds["red"]),
+    })
+
+
+def _coarsen_for_display(data, max_pixels=DISPLAY_MAX_PIXELS):
+    """Block-average (y, x) map(s) so the longest side is at most `max_pixels`."""
+    factor = -(-max(data.sizes["y"], data.sizes["x"]) // max_pixels)
+    if factor <= 1:
+        return data
+    return data.coarsen(y=factor, x=factor, boundary="trim").mean()
+
+
+def _finish_figure(fig, title, dpi):
+    """Title, lay out, save as `<title>.png` and show a map figure."""
+    fig.suptitle(title, fontsize=16, fontweight="bold")
+    fig.tight_layout(rect=[0, 0, 1, 0.95])
+    filename = f"{title.replace(' ', '_')}.png"
+    fig.savefig(filename, dpi=dpi, bbox_inches="tight")
+    plt.show()
+
+
+def compute_wqi_stats(stack):
     """
-    return (b1 - b2) / (b1 + b2 + 1e-10)
+    Compute per-pixel temporal mean and standard deviation of NDWI, NDTI and NDCI.
+
+    Both reductions run in a single `dask.compute`, so each band chunk is read
+    once. Pass the results to `plot_wqi_mean_maps` / `plot_wqi_std_maps` to plot
+    both figures without recomputing.
+
+    Parameters
+    ----------
+    stack : xarray.DataArray
+        Multi-band stack containing at least 'green', 'red', 'nir', 'rededge1'.
+
+    Returns
+    -------
+    means, stds : xarray.Dataset
+        Temporal mean and standard deviation with variables "NDWI", "NDTI", "NDCI".
+    """
+    ds = _wqi_dataset(stack)
+    return dask.compute(ds.mean("time"), ds.std("time"))
 
 
 # Annual Mean WQI Maps
 def plot_wqi_mean_maps(
     stack,
     title="Tampa Bay Water Quality Index (Annual Mean)",
-    cmap="RdYlBu_r"
+    cmap="RdYlBu_r",
+    means=None,
+    dpi=300
 ):
     """
     Plot annual mean maps of NDWI, NDTI, and NDCI from a stackstac stack.
@@ -35,28 +90,24 @@ def plot_wqi_mean_maps(
         Title for the figure and PNG file.
     cmap : str
         Colormap to use for plotting.
+    means : xarray.Dataset, optional
+        Precomputed temporal means from `compute_wqi_stats`; `stack` is not read if given.
+    dpi : int
+        Resolution of the saved PNG. Default: 300.
 
     Returns
     -------
     None
     """
-    # Extract bands
-    green = stack.sel(band="green")
-    red = stack.sel(band="red")
-    nir = stack.sel(band="nir")
-    rededge1 = stack.sel(band="rededge1")
-
-    # Compute indices
-    indices = {
-        "NDWI": normalized_diff(green, nir),
-        "NDTI": normalized_diff(red, green),
-        "NDCI": normalized_diff(rededge1, red),
-    }
+    # All three indices reduced over time in one pass, unless precomputed;
+    # coarsened lazily so only display-sized maps reach the client
+    if means is None:
+        means = _coarsen_for_display(_wqi_dataset(stack).mean("time")).compute()
 
     fig, axes = plt.subplots(1, 3, figsize=(18, 6), sharex=True, sharey=True)
 
-    for ax, (name, data) in zip(axes, indices.items()):
-        mean_data = data.mean("time")
+    for ax, name in zip(axes, means.data_vars):
+        mean_data = _coarsen_for_display(means[name])
         mean_data.plot(
             ax=ax,
             cmap=cmap,
@@ -69,17 +120,16 @@ def plot_wqi_mean_maps(
         ax.set_ylabel("Northing (m)")
         ax.set_aspect("equal")
 
-    plt.suptitle(title, fontsize=16, fontweight="bold")
-    plt.tight_layout(rect=[0, 0, 1, 0.95])
-    plt.savefig(f"{title.replace(' ', '_')}.png", dpi=300, bbox_inches="tight")
-    plt.show()
+    _finish_figure(fig, title, dpi)
 
 
 # WQI Standard Deviation Maps (All Indices)
 def plot_wqi_std_maps(
     stack,
     title="Tampa Bay Water Quality Index (Temporal Variability)",
-    cmap="Reds"
+    cmap="Reds",
+    stds=None,
+    dpi=300
 ):
     """
     Plot temporal standard deviation maps of NDWI, NDTI, and NDCI from a stackstac stack.
@@ -92,28 +142,24 @@ def plot_wqi_std_maps(
         Title for the figure and PNG file.
     cmap : str
         Colormap to use for plotting.
+    stds : xarray.Dataset, optional
+        Precomputed temporal standard deviations from `compute_wqi_stats`; `stack` is not read if given.
+    dpi : int
+        Resolution of the saved PNG. Default: 300.
 
     Returns
     -------
     None
     """
-    # Extract bands
-    green = stack.sel(band="green")
-    red = stack.sel(band="red")
-    nir = stack.sel(band="nir")
-    rededge1 = stack.sel(band="rededge1")
-
-    # Compute indices
-    indices = {
-        "NDWI": normalized_diff(green, nir),
-        "NDTI": normalized_diff(red, green),
-        "NDCI": normalized_diff(rededge1, red),
-    }
+    # All three indices reduced over time in one pass, unless precomputed;
+    # coarsened lazily so only display-sized maps reach the client
+    if stds is None:
+        stds = _coarsen_for_display(_wqi_dataset(stack).std("time")).compute()
 
     fig, axes = plt.subplots(1, 3, figsize=(18, 6), sharex=True, sharey=True)
 
-    for ax, (name, data) in zip(axes, indices.items()):
-        std_data = data.std("time")
+    for ax, name in zip(axes, stds.data_vars):
+        std_data = _coarsen_for_display(stds[name])
         std_data.plot(
             ax=ax,
             cmap=cmap,
@@ -126,7 +172,4 @@ def plot_wqi_std_maps(
         ax.set_ylabel("Northing (m)")
         ax.set_aspect("equal")
 
-    plt.suptitle(title, fontsize=16, fontweight="bold")
-    plt.tight_layout(rect=[0, 0, 1, 0.95])
-    plt.savefig(f"{title.replace(' ', '_')}.png", dpi=300, bbox_inches="tight")
-    plt.show()
+    _finish_figure(fig, title, dpi)
@@ -0,0 +1,180 @@
+import functools
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+from pystac import ItemCollection
+
+# Items per search page; large pages cut pagination round-trips
+STAC_PAGE_SIZE = 1000
+
+
+@functools.lru_cache(maxsize=4)
+def stac_client(stac_api_url):
+    """
+    Open a STAC API client once per URL.
+
+    Reusing the client skips the landing-page request and keeps its pooled
+    HTTP session (and TLS connections) alive across searches.
+
+    Parameters
+    ----------
+    stac_api_url : str
+        Root URL of the STAC API.
+
+    Returns
+    -------
+    pystac_client.Client
+    """
+    # Imported here so modules using only the cache helpers skip the client stack
+    from pystac_client import Client as StacClient
+
+    return StacClient.open(stac_api_url)
+
+
+def search_items(
+    client,
+    collection,
+    bbox,
+    start_date,
+    end_date,
+    max_items=None,
+    cache_dir=None,
+    max_age_days=30
+):
+    """
+    Run a STAC search and return its items, optionally cached on disk.
+
+    Parameters
+    ----------
+    client : pystac_client.Client
+        Open STAC API client to search.
+    collection : str
+        STAC collection ID (e.g., "sentinel-2-l2a").
+    bbox : tuple (min_lon, min_lat, max_lon, max_lat)
+        Bounding box for the search.
+    start_date, end_date : str
+        ISO date strings ("YYYY-MM-DD") bounding the search.
+    max_items : int, optional
+        Maximum number of items to return. Default: None (all matches).
+    cache_dir : str, optional
+        Directory for cached search results. Results are keyed on
+        (API URL, collection, bbox, date range, max_items). Default: None (no caching).
+    max_age_days : float
+        Cached results older than this are refreshed from the API. Default: 30.
+
+    Returns
+    -------
+    pystac.ItemCollection
+        Items matching the search.
+    """
+    cache_path = None
+    if cache_dir is not None:
+        key = json.dumps(
+            [client.get_self_href(), collection, list(bbox), start_date, end_date, max_items]
+        )
+        cache_path = os.path.join(cache_dir, f"{hashlib.sha1(key.encode()).hexdigest()}.json")
+
+        if (
+            os.path.exists(cache_path)
+            and time.time() - os.path.getmtime(cache_path) < max_age_days * 86400
+        ):
+            try:
+                with open(cache_path) as f:
+                    return ItemCollection.from_dict(json.load(f))
+            except ValueError:
+                # Unreadable cache entry; treat as a miss and overwrite it below
+                pass
+
+    search = client.search(
+        collections=[collection],
+        bbox=bbox,
+        datetime=f"{start_date}/{end_date}",
+        max_items=max_items,
+        limit=STAC_PAGE_SIZE
+    )
+    items = search.item_collection()
+
+    if cache_path is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        # Write to a temp file and rename, so an interrupted run never leaves
+        # a truncated entry behind
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(items.to_dict(), f)
+            os.replace(tmp_path, cache_path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    return items
+
+
+def cog_gdal_env():
+    """
+    GDAL environment for `stackstac.stack` tuned for Cloud-Optimized GeoTIFFs over HTTP.
+
+    Merges adjacent byte ranges into single requests, multiplexes them over
+    HTTP/2, and keeps fetched blocks in GDAL's in-memory VSI cache.
+
+    Returns
+    -------
+    stackstac.rio_env.LayeredEnv
+        `stackstac.DEFAULT_GDAL_ENV` with the HTTP settings layered on top.
+    """
+    import stackstac
+
+    return stackstac.DEFAULT_GDAL_ENV.updated(
+        always=dict(
+            GDAL_HTTP_MERGE_CONSECUTIVE_RANGES="YES",
+            GDAL_HTTP_MULTIPLEX="YES",
+            GDAL_HTTP_VERSION="2",
+            GDAL_INGESTED_BYTES_AT_OPEN="32768",
+            CPL_VSIL_CURL_CACHE_SIZE="200000000",
+            VSI_CACHE="TRUE"
+        )
+    )
+
+
+def stack_items(items, assets, bbox, epsg, dtype="float32"):
+    """
+    Lazily stack STAC COG assets into an array clipped to a bounding box.
+
+    Parameters
+    ----------
+    items : sequence of pystac.Item
+        Scenes to stack.
+    assets : list of str
+        Asset keys to load as bands (e.g., ["green", "nir", "scl"]).
+    bbox : tuple (min_lon, min_lat, max_lon, max_lat)
+        Bounding box to clip to.
+    epsg : int
+        EPSG code of the output grid.
+    dtype : str
+        Output dtype. Float stacks are filled with NaN, integer stacks with 0
+        (the Sentinel-2 nodata value). Default: "float32".
+
+    Returns
+    -------
+    xarray.DataArray
+        Dask-backed (time, band, y, x) stack of raw values, chunked as
+        one scene x all bands x 1024x1024 tiles.
+    """
+    import stackstac
+
+    fill_value = np.dtype(dtype).type(np.nan if np.issubdtype(dtype, np.floating) else 0)
+    return stackstac.stack(
+        items,
+        assets=assets,
+        bounds_latlon=bbox,
+        epsg=epsg,
+        chunksize=(1, -1, 1024, 1024),
+        dtype=dtype,
+        fill_value=fill_value,
+        rescale=False,
+        gdal_env=cog_gdal_env()
+    )
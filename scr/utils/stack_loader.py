@@ -1,6 +1,4 @@
-import numpy as np
-import stackstac
-from pystac_client import Client as StacClient
+from stac_utils import search_items, stac_client, stack_items
 
 def load_wqi_stack(
     bbox,
@@ -9,7 +7,9 @@ def load_wqi_stack(
     epsg=32617,
     max_items=100,
     filter_clouds=True,
-    max_cloud_cover=20
+    max_cloud_cover=20,
+    cache_dir=None,
+    assets=("green", "red", "nir", "rededge1")
 ):
     """
     Load a Sentinel-2 stack for WQI calculation from STAC.
@@ -30,37 +30,34 @@ def load_wqi_stack(
         If True, filter images with cloud cover above max_cloud_cover.
     max_cloud_cover : float, default 20
         Maximum cloud cover (%) allowed if filter_clouds is True.
+    cache_dir : str, optional
+        Directory for caching STAC search results between runs.
+    assets : sequence of str, default ("green", "red", "nir", "rededge1")
+        Bands to stack. All bands of a tile are read together, so add "scl" only
+        when the Scene Classification band is actually used.
 
     Returns
     -------
     xarray.Dataset
-        Dask-backed stack of Sentinel-2 bands ('green', 'red', 'nir', 'rededge1', 'scl') ready for WQI processing.
+        Dask-backed stack of the requested Sentinel-2 bands ready for WQI processing.
     """
-    client = StacClient.open("https://earth-search.aws.element84.com/v1")
-    search = client.search(
-        collections=["sentinel-2-l2a"],
-        bbox=bbox,
-        datetime=f"{start_date}/{end_date}",
-        max_items=max_items
+    client = stac_client("https://earth-search.aws.element84.com/v1")
+    items = search_items(
+        client,
+        "sentinel-2-l2a",
+        bbox,
+        start_date,
+        end_date,
+        max_items=max_items,
+        cache_dir=cache_dir
     )
 
-    items = search.item_collection()
-
     if filter_clouds:
         items = [
             i for i in items
             if i.properties.get("eo:cloud_cover", 100) < max_cloud_cover
         ]
 
-    stack = stackstac.stack(
-        items,
-        assets=["green", "red", "nir", "rededge1", "scl"],
-        bounds_latlon=bbox,
-        epsg=epsg,
-        chunksize=(1, 1, -1, "auto"),
-        dtype="float32",
-        fill_value=np.float32(np.nan),
-        rescale=False
-    )
+    stack = stack_items(items, list(assets), bbox, epsg)
     print("Stack loaded with shape:", stack.shape)
     return stack